@@ -93,6 +93,7 @@ def get_default_config():
     cfg.data = CN()
     cfg.data.root = 'data'
     cfg.data.workers = 4  # number of data loading workers
+    cfg.data.persistent_test_workers = False  # keep the test loader workers alive between evaluations
     cfg.data.split_id = 0  # Split index
     cfg.data.height = 256  # image height
     cfg.data.width = 128  # image width
@@ -155,6 +156,7 @@ def get_default_config():
     cfg.train.ema = CN()
     cfg.train.ema.enable = False
     cfg.train.ema.ema_decay = 0.9999
+    cfg.train.ema.ema_start_epoch = 0  # the EMA is also not updated until the LR warmup is finished
     cfg.train.sam = CN()
     cfg.train.sam.rho = 0.05
     cfg.train.sam.adaptive = False
@@ -400,6 +402,20 @@ def merge_from_files_with_base(cfg, cfg_path):
     print('End merging of config files with inheritance')
 
 
+def merge_from_dict_with_base(cfg, cfg_dict):
+    """Merges an in-memory config (e.g. a parsed yaml file) into cfg,
+    resolving its "_base_" field the same way as merge_from_files_with_base.
+    """
+    base = cfg_dict.get('_base_')
+    if isinstance(base, list):
+        if len(base) > 1:
+            raise NotImplementedError('Multiple inheritance of configs is not implemented')
+        base = base[0] if base else None
+    if base:
+        merge_from_files_with_base(cfg, base)
+    cfg.merge_from_other_cfg(CN(cfg_dict))
+
+
 def imagedata_kwargs(cfg):
     return {
         'root': cfg.data.root,
@@ -413,6 +429,7 @@ def imagedata_kwargs(cfg):
         'batch_size_test': cfg.test.batch_size,
         'correct_batch_size': cfg.train.correct_batch_size,
         'workers': cfg.data.workers,
+        'persistent_test_workers': cfg.data.persistent_test_workers,
         'train_sampler': cfg.sampler.train_sampler,
         'custom_dataset_roots': cfg.custom_datasets.roots,
         'custom_dataset_types': cfg.custom_datasets.types,
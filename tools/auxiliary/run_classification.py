@@ -3,15 +3,20 @@
 #
 
 import argparse
+import copy
+import importlib.util
+import mmap
+import multiprocessing as mp
 import os
 import re
-import tempfile
+import traceback
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from subprocess import run # nosec
 import json
 
 import numpy as np
-from ruamel.yaml import YAML
+import yaml
 
 
 def get_lr_sets(model_name: str):
@@ -38,136 +43,192 @@ def get_lr_sets(model_name: str):
                 "birdsnap": 0.003,"FashionMNIST": 0.003, "SUN397": 0.003, "SVHN": 0.003,
                 "attd_mi02_v3": 0.003, "attd_mi04_v4": 0.003, "lgchem": 0.003, "autism": 0.003}
 
-def read_config(yaml: YAML, config_path: str):
-    yaml.default_flow_style = True
+# libyaml bindings are much faster, the pure python ones are the fallback
+YamlLoader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+YamlDumper = getattr(yaml, 'CSafeDumper', yaml.SafeDumper)
+
+def read_config(config_path: str):
     with open(config_path, 'r') as f:
-        cfg = yaml.load(f)
+        cfg = yaml.load(f, Loader=YamlLoader)
     return cfg
 
-def dump_config(yaml: YAML, config_path: str, cfg: dict):
+def dump_config(config_path: str, cfg: dict):
     with open(config_path, 'w') as f:
-        yaml.default_flow_style = True
-        yaml.dump(cfg, f)
+        yaml.dump(cfg, f, Dumper=YamlDumper, default_flow_style=True)
+
+def load_train_entry(path_to_main: str):
+    spec = importlib.util.spec_from_file_location('torchreid_train_main', path_to_main)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.main
+
+DatasetSpec = namedtuple('DatasetSpec', ['roots', 'names', 'types', 'sources', 'targets'])
+
+# datasets to experiment with
+DATASETS = dict(
+    CIFAR100=DatasetSpec(
+        roots=('CIFAR100/train', 'CIFAR100/val'),
+        names=('CIFAR100_train', 'CIFAR100_val'),
+        types=('classification_image_folder', 'classification_image_folder'),
+        sources='CIFAR100_train',
+        targets='CIFAR100_val',
+    ),
+    flowers=DatasetSpec(
+        roots=('flowers/train.txt', 'flowers/val.txt'),
+        names=('flowers_train', 'flowers_val'),
+        types=('classification', 'classification'),
+        sources='flowers_train',
+        targets='flowers_val',
+    ),
+    cars=DatasetSpec(
+        roots=('cars/train.txt', 'cars/val.txt'),
+        names=('cars_train', 'cars_val'),
+        types=('classification', 'classification'),
+        sources='cars_train',
+        targets='cars_val',
+    ),
+    DTD=DatasetSpec(
+        roots=('DTD/train', 'DTD/val'),
+        names=('DTD_train', 'DTD_val'),
+        types=('classification_image_folder', 'classification_image_folder'),
+        sources='DTD_train',
+        targets='DTD_val',
+    ),
+    pets=DatasetSpec(
+        roots=('pets/train.txt', 'pets/val.txt'),
+        names=('pets_train', 'pets_val'),
+        types=('classification', 'classification'),
+        sources='pets_train',
+        targets='pets_val',
+    ),
+    birdsnap=DatasetSpec(
+        roots=('birdsnap/train.txt', 'birdsnap/val.txt'),
+        names=('birdsnap_train', 'birdsnap_val'),
+        types=('classification', 'classification'),
+        sources='birdsnap_train',
+        targets='birdsnap_val',
+    ),
+    caltech101=DatasetSpec(
+        roots=('caltech101/train.txt', 'caltech101/val.txt'),
+        names=('caltech101_train', 'caltech101_val'),
+        types=('classification', 'classification'),
+        sources='caltech101_train',
+        targets='caltech101_val',
+    ),
+    FOOD101=DatasetSpec(
+        roots=('FOOD101/train.txt', 'FOOD101/val.txt'),
+        names=('FOOD101_train', 'FOOD101_val'),
+        types=('classification', 'classification'),
+        sources='FOOD101_train',
+        targets='FOOD101_val',
+    ),
+    lg_chem=DatasetSpec(
+        roots=('lg_chem/train.txt', 'lg_chem/val.txt'),
+        names=('lg_chem_train', 'lg_chem_val'),
+        types=('classification', 'classification'),
+        sources='lg_chem_train',
+        targets='lg_chem_val',
+    ),
+    autism=DatasetSpec(
+        roots=('autism/train', 'autism/val'),
+        names=('autism_train', 'autism_val'),
+        types=('classification_image_folder', 'classification_image_folder'),
+        sources='autism_train',
+        targets='autism_val',
+    ),
+    attd_mi04_v4=DatasetSpec(
+        roots=('attd_mi04_v4/train.txt', 'attd_mi04_v4/val.txt'),
+        names=('attd_mi04_v4_train', 'attd_mi04_v4_val'),
+        types=('classification', 'classification'),
+        sources='attd_mi04_v4_train',
+        targets='attd_mi04_v4_val',
+    ),
+    attd_mi02_v3=DatasetSpec(
+        roots=('attd_mi02_v3/train.txt', 'attd_mi02_v3/val.txt'),
+        names=('attd_mi02_v3_train', 'attd_mi02_v3_val'),
+        types=('classification', 'classification'),
+        sources='attd_mi02_v3_train',
+        targets='attd_mi02_v3_val',
+    )
+)
+
+# metric lines may be prefixed with the timestamp added by torchreid.utils.Logger
+METRIC_RE = re.compile(rb'^(?:[^|\n]*\|)?(mAP|Rank-1|Rank-5)\D*(\d+\.\d+)', re.MULTILINE)
+
+def collect_results(path_to_exp_folder: str, dataset_names):
+    """Collects metrics of every dataset from the training logs in its experiment folder"""
+    saver = dict()
+    for name in dataset_names:
+        logs = sorted(Path(path_to_exp_folder, name).glob('train.log*'))
+        metrics = dict()
+        for log in logs:
+            if log.stat().st_size == 0:
+                continue
+            # the regex runs over the mapped bytes, so the log is neither decoded nor split in lines
+            with open(log, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as text:
+                for m in METRIC_RE.finditer(text):
+                    metrics.setdefault(m.group(1).decode(), []).append(float(m.group(2)))
+        if metrics:
+            saver[name] = metrics
+    return saver
+
+_train_entry = None
+
+def init_worker(path_to_main: str, resources):
+    """Pins the pool worker to its own GPU and CPU cores. It has to happen before torch is imported."""
+    global _train_entry # pylint: disable=global-statement
+    gpu_id, cores = resources.get()
+    os.environ['CUDA_VISIBLE_DEVICES'] = str(gpu_id)
+    if cores:
+        # avoid oversubscription: by default every worker would spawn a thread per core
+        os.environ['OMP_NUM_THREADS'] = str(len(cores))
+        os.environ['MKL_NUM_THREADS'] = str(len(cores))
+        os.sched_setaffinity(0, cores)
+    _train_entry = load_train_entry(path_to_main)
+
+def train_domain(key: str, cfg: dict, gpu_num: int):
+    try:
+        _train_entry(['--gpu-num', f'{int(gpu_num)}'], config=cfg)
+    except Exception: # pylint: disable=broad-except
+        print(f'Training on {key} failed:')
+        traceback.print_exc()
 
 def main():
+    global _train_entry # pylint: disable=global-statement
     parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
     parser.add_argument( '--root', type=str, required=False, default='/datasets/classification', help='path to folder with datasets')
     parser.add_argument('--config', type=str, required=False, help='path to config file')
     parser.add_argument('--path-to-main', type=str, default='./tools/main.py',required=False, help='path to main.py file')
     parser.add_argument('--gpu-num', type=int, default=1, help='Number of GPUs for training. 0 is for CPU mode')
+    parser.add_argument('--num-parallel', type=int, default=1,
+                        help='Number of domains trained simultaneously, each one on its own GPU')
     parser.add_argument('--use-hardcoded-lr', action='store_true')
     parser.add_argument('-d','--domains', nargs='+', help='On what domains to train', required=False, default=['all'])
     parser.add_argument('--dump-results', type=bool, default=True, help='whether or not to dump results of the experiment')
     args = parser.parse_args()
-    yaml = YAML()
-
-    # datasets to experiment with
-    datasets = dict(
-        CIFAR100=dict(
-            roots=['CIFAR100/train', 'CIFAR100/val'],
-            names=['CIFAR100_train', 'CIFAR100_val'],
-            types=['classification_image_folder', 'classification_image_folder'],
-            sources='CIFAR100_train',
-            targets='CIFAR100_val',
-        ),
-        flowers=dict(
-            roots=['flowers/train.txt', 'flowers/val.txt'],
-            names=['flowers_train', 'flowers_val'],
-            types=['classification', 'classification'],
-            sources='flowers_train',
-            targets='flowers_val',
-        ),
-        cars=dict(
-            roots=['cars/train.txt', 'cars/val.txt'],
-            names=['cars_train', 'cars_val'],
-            types=['classification', 'classification'],
-            sources='cars_train',
-            targets='cars_val',
-        ),
-        DTD=dict(
-            roots=['DTD/train', 'DTD/val'],
-            names=['DTD_train', 'DTD_val'],
-            types=['classification_image_folder', 'classification_image_folder'],
-            sources='DTD_train',
-            targets='DTD_val',
-        ),
-        pets=dict(
-            roots=['pets/train.txt', 'pets/val.txt'],
-            names=['pets_train', 'pets_val'],
-            types=['classification', 'classification'],
-            sources='pets_train',
-            targets='pets_val',
-        ),
-        birdsnap=dict(
-            roots=['birdsnap/train.txt', 'birdsnap/val.txt'],
-            names=['birdsnap_train', 'birdsnap_val'],
-            types=['classification', 'classification'],
-            sources='birdsnap_train',
-            targets='birdsnap_val',
-        ),
-        caltech101=dict(
-            roots=['caltech101/train.txt', 'caltech101/val.txt'],
-            names=['caltech101_train', 'caltech101_val'],
-            types=['classification', 'classification'],
-            sources='caltech101_train',
-            targets='caltech101_val',
-        ),
-        FOOD101=dict(
-            roots=['FOOD101/train.txt', 'FOOD101/val.txt'],
-            names=['FOOD101_train', 'FOOD101_val'],
-            types=['classification', 'classification'],
-            sources='FOOD101_train',
-            targets='FOOD101_val',
-        ),
-        lg_chem=dict(
-            roots=['lg_chem/train.txt', 'lg_chem/val.txt'],
-            names=['lg_chem_train', 'lg_chem_val'],
-            types=['classification', 'classification'],
-            sources='lg_chem_train',
-            targets='lg_chem_val',
-        ),
-        autism=dict(
-            roots=['autism/train', 'autism/val'],
-            names=['autism_train', 'autism_val'],
-            types=['classification_image_folder', 'classification_image_folder'],
-            sources='autism_train',
-            targets='autism_val',
-        ),
-        attd_mi04_v4=dict(
-            roots=['attd_mi04_v4/train.txt', 'attd_mi04_v4/val.txt'],
-            names=['attd_mi04_v4_train', 'attd_mi04_v4_val'],
-            types=['classification', 'classification'],
-            sources='attd_mi04_v4_train',
-            targets='attd_mi04_v4_val',
-        ),
-        attd_mi02_v3=dict(
-            roots=['attd_mi02_v3/train.txt', 'attd_mi02_v3/val.txt'],
-            names=['attd_mi02_v3_train', 'attd_mi02_v3_val'],
-            types=['classification', 'classification'],
-            sources='attd_mi02_v3_train',
-            targets='attd_mi02_v3_val',
-        )
-    )
 
     path_to_base_cfg = args.config
     # write datasets you want to skip
     domains = args.domains
     if 'all' in domains:
-        domains = set(datasets.keys())
+        domains = set(DATASETS.keys())
 
+    # the base config is the same for every domain, parse it once
+    base_cfg = read_config(path_to_base_cfg)
+    lrs_dict = get_lr_sets(base_cfg["model"]["name"])
+    domain_cfgs = dict()
     for key in domains:
-        params = datasets[key]
-        cfg = read_config(yaml, path_to_base_cfg)
-        lrs_dict = get_lr_sets(cfg["model"]["name"])
+        params = DATASETS[key]
+        cfg = copy.deepcopy(base_cfg)
         if key in ["attd_mi02_v3", "attd_mi04_v4", "lg_chem", "fashionMNIST", "SVHN"]:
             cfg['data']['transforms']['augmix']['grey_imgs'] = True
         path_to_exp_folder = cfg['data']['save_dir']
-        name_train = params['names'][0]
-        name_val = params['names'][1]
-        type_train = params['types'][0]
-        type_val = params['types'][1]
-        root_train = args.root + os.sep + params['roots'][0]
-        root_val = args.root + os.sep + params['roots'][1]
+        name_train = params.names[0]
+        name_val = params.names[1]
+        type_train = params.types[0]
+        type_val = params.types[1]
+        root_train = args.root + os.sep + params.roots[0]
+        root_val = args.root + os.sep + params.roots[1]
         if args.use_hardcoded_lr:
             print("WARNING: Using hardcoded LR")
             if key in lrs_dict:
@@ -182,66 +243,62 @@ def main():
 
         cfg['data']['save_dir'] = path_to_exp_folder + f"/{key}"
 
-        source = params['sources']
-        targets = params['targets']
+        source = params.sources
+        targets = params.targets
         cfg['data']['sources'] = [source]
         cfg['data']['targets'] = [targets]
-        # dump it
-        fd, tmp_path_to_cfg = tempfile.mkstemp(suffix='.yml')
-        try:
-            with os.fdopen(fd, 'w') as tmp:
-                # do stuff with temp file
-                yaml.default_flow_style = True
-                yaml.dump(cfg, tmp)
-                tmp.close()
-
-            # run training
-            run(['python', f'{str(args.path_to_main)}',
-                '--config', f'{tmp_path_to_cfg}',
-                '--gpu-num', f'{int(args.gpu_num)}'],
-                shell=False)
-        finally:
-            os.remove(tmp_path_to_cfg)
+        domain_cfgs[key] = cfg
+
+    # run training
+    if args.num_parallel > 1:
+        # forkserver is used since forked processes can not reinitialize CUDA
+        ctx = mp.get_context('forkserver')
+        visible_gpus = os.environ.get('CUDA_VISIBLE_DEVICES')
+        visible_gpus = visible_gpus.split(',') if visible_gpus else range(args.num_parallel)
+        # every worker takes one GPU from the queue in its initializer, so there can't be more workers than GPUs
+        worker_gpus = list(visible_gpus)[:args.num_parallel]
+        if len(worker_gpus) < args.num_parallel:
+            print(f'WARNING: only {len(worker_gpus)} GPUs are visible, '
+                  f'training {len(worker_gpus)} domains simultaneously instead of {args.num_parallel}')
+        cpus = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else []
+        cores_per_worker = len(cpus) // len(worker_gpus)
+        resources = ctx.Queue()
+        for i, gpu_id in enumerate(worker_gpus):
+            cores = set(cpus[i * cores_per_worker: (i + 1) * cores_per_worker])
+            resources.put((gpu_id, cores))
+        with ProcessPoolExecutor(max_workers=len(worker_gpus), mp_context=ctx,
+                                 initializer=init_worker,
+                                 initargs=(args.path_to_main, resources)) as pool:
+            futures = [pool.submit(train_domain, key, cfg, 1) for key, cfg in domain_cfgs.items()]
+            for future in futures:
+                future.result()
+    else:
+        # training runs in this process, so torch and CUDA are initialized only once for all domains
+        _train_entry = load_train_entry(args.path_to_main)
+        for key, cfg in domain_cfgs.items():
+            train_domain(key, cfg, args.gpu_num)
+
     # after training combine all outputs in one file
     if args.dump_results:
-        path_to_bash = str(Path.cwd() / 'tools/classification/parse_output.sh')
-        run(['bash', f'{path_to_bash}', f'{path_to_exp_folder}'], shell=False)
-        saver = dict()
         path_to_file = f"{path_to_exp_folder}/combine_all.txt"
-        # parse output file from bash script
-        with open(path_to_file, 'r') as f:
-            for line in f:
-                if line.strip() in datasets.keys():
-                    next_dataset = line.strip()
-                    saver[next_dataset] = dict()
-                    continue
-                else:
-                    for metric in ['mAP', 'Rank-1', 'Rank-5']:
-                        if line.strip().startswith(metric):
-                            if not metric in saver[next_dataset]:
-                                saver[next_dataset][metric] = []
-                            pattern = re.search('\d+\.\d+', line.strip())
-                            if pattern:
-                                saver[next_dataset][metric].append(
-                                    float(pattern.group(0))
-                                )
+        saver = collect_results(path_to_exp_folder, DATASETS.keys())
 
         # dump in appropriate patern
-        names = ''
-        values = ''
+        names = []
+        values = []
         with open(path_to_file, 'a') as f:
-            for key in sorted(datasets.keys()):
-                names += key + ' '
+            for key in sorted(DATASETS.keys()):
+                names.append(key + ' ')
                 if key in saver:
-                    best_top_1_idx = np.argmax(saver[key]['Rank-1'])
-                    top1 = str(saver[key]['Rank-1'][best_top_1_idx])
-                    mAP = str(saver[key]['mAP'][best_top_1_idx])
-                    top5 = str(saver[key]['Rank-5'][best_top_1_idx])
-                    values += mAP + ';' + top1 + ';' + top5 + ';'
+                    top1 = np.asarray(saver[key]['Rank-1'], dtype=np.float32)
+                    best_top_1_idx = int(top1.argmax())
+                    mAP = saver[key]['mAP'][best_top_1_idx]
+                    top5 = saver[key]['Rank-5'][best_top_1_idx]
+                    values.append(f'{mAP:.2f};{top1[best_top_1_idx]:.2f};{top5:.2f};{best_top_1_idx};')
                 else:
-                    values += '-1;-1;-1;'
+                    values.append('-1;-1;-1;-1;')
 
-            f.write(f"\n{names}\n{values}")
+            f.write('\n' + ''.join(names) + '\n' + ''.join(values))
 
 if __name__ == "__main__":
     main()
@@ -150,7 +150,7 @@ def main():
             os.remove(tmp_path_to_cfg)
     # after training combine all outputs in one file
     if args.dump_results:
-        path_to_bash = str(Path.cwd() / 'tools/classification/parse_output.sh')
+        path_to_bash = str(Path(__file__).resolve().parent / 'parse_output.sh')
         run(['bash', f'{path_to_bash}', f'{path_to_exp_folder}'], shell=False)
         saver = dict()
         path_to_file = f"{path_to_exp_folder}/combine_all.txt"
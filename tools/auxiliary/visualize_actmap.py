@@ -61,12 +61,12 @@ def build_dataset(mode='gallery', targets=None, height=192, width=256,
     return dataset
 
 
-def build_data_loader(dataset, use_gpu=True, batch_size=100):
+def build_data_loader(dataset, use_gpu=True, batch_size=100, workers=1):
     data_loader = torch.utils.data.DataLoader(
         dataset,
         batch_size=batch_size,
         shuffle=False,
-        num_workers=1,
+        num_workers=workers,
         pin_memory=use_gpu,
         drop_last=False
     )
@@ -77,7 +77,7 @@ def build_data_loader(dataset, use_gpu=True, batch_size=100):
 def prepare_data(cfg, mode='query'):
     data_config = imagedata_kwargs(cfg)
     dataset = build_dataset(mode=mode, **data_config)
-    data_loader = build_data_loader(dataset, use_gpu=cfg.use_gpu)
+    data_loader = build_data_loader(dataset, use_gpu=cfg.use_gpu, workers=cfg.data.workers)
 
     pids = dataset.num_train_pids
     keys = sorted(pids.keys())
@@ -101,7 +101,7 @@ def visualize_activation_map(model, data_loader, save_dir, width, height, use_gp
     for batch_idx, data in enumerate(data_loader):
         imgs, paths = data[0], data[3]
         if use_gpu:
-            imgs = imgs.cuda()
+            imgs = imgs.cuda(non_blocking=True)
 
         try:
             outputs = model(imgs, return_featuremaps=True)
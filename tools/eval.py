@@ -25,7 +25,7 @@ from scripts.script_utils import reset_config, build_base_argparser, check_class
 import torchreid
 from torchreid.integration.nncf.compression import get_compression_hyperparams
 from torchreid.ops import DataParallel
-from torchreid.utils import (Logger, set_random_seed, load_pretrained_weights,)
+from torchreid.utils import (Logger, set_random_seed, load_pretrained_weights, fuse_conv_bn)
 from torchreid.engine import build_engine
 from torchreid.integration.nncf.compression_script_utils import (make_nncf_changes_in_eval,
                                                                  make_nncf_changes_in_config)
@@ -71,6 +71,8 @@ def main():
             print('Begin making NNCF changes in model')
             model = make_nncf_changes_in_eval(model, cfg)
             print('End making NNCF changes in model')
+        else:
+            fuse_conv_bn(model)
         if cfg.use_gpu:
             num_devices = min(torch.cuda.device_count(), args.gpu_num)
             main_device_ids = list(range(num_devices))
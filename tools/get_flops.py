@@ -3,7 +3,10 @@
 #
 
 import argparse
+import hashlib
 import json
+import os
+import os.path as osp
 
 import torch
 from scripts.default_config import (get_default_config, imagedata_kwargs,
@@ -29,6 +32,26 @@ def reset_config(cfg, args):
         cfg.custom_datasets.names = args.custom_names
 
 
+def fvcore_complexity(model, input_, verbose=False):
+    flops = FlopCountAnalysis(model, input_)
+    flops.unsupported_ops_warnings(False)
+    flops.uncalled_modules_warnings(False)
+    # the analysis is lazy, the traced forward runs here
+    with torch.no_grad():
+        macs = flops.total()
+    if verbose:
+        print(flop_count_table(flops))
+    return macs
+
+
+def get_cache_path(cfg, classification_classes_filter=None):
+    """Returns path to the json file with cached complexity of the model built from cfg"""
+    cache_dir = osp.join(osp.expanduser(os.getenv('XDG_CACHE_HOME', '~/.cache')), 'torchreid', 'flops')
+    key = json.dumps({'cfg': cfg, 'classes': classification_classes_filter}, sort_keys=True)
+    cfg_hash = hashlib.sha1(key.encode()).hexdigest() # nosec
+    return osp.join(cache_dir, f'{cfg_hash}.json')
+
+
 def main():
     parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
     parser.add_argument('--config-file', type=str, default='', required=True,
@@ -43,8 +66,15 @@ def main():
     parser.add_argument('--classes', type=str, nargs='+',
                         help='name of classes in classification dataset')
     parser.add_argument('--out')
+    parser.add_argument('--num-classes', type=int, default=None,
+                        help='number of classes of the model; if set, the dataset is not built')
+    parser.add_argument('--use-cache', action='store_true',
+                        help='reuse the number of classes and complexity cached for the same config; '
+                             'the cache is keyed on the config only, so it is stale after model code changes')
     parser.add_argument('--fvcore', action='store_true',
                         help='option to use fvcore tool from Meta Platforms for the flops counting')
+    parser.add_argument('--verbose', action='store_true',
+                        help='print per-module complexity table (fvcore only)')
     parser.add_argument('opts', default=None, nargs=argparse.REMAINDER,
                         help='Modify config options using the command-line')
     args = parser.parse_args()
@@ -61,22 +91,46 @@ def main():
 
     if cfg.use_gpu:
         torch.backends.cudnn.benchmark = True
-
-    datamanager = build_datamanager(cfg, args.classes)
-    num_train_classes = datamanager.num_train_ids
-
-    print(f'Building main model: {cfg.model.name}')
-    model = torchreid.models.build_model(**model_kwargs(cfg, num_train_classes))
-    macs, num_params = get_model_complexity_info(model, (3, cfg.data.height, cfg.data.width),
-                                                 as_strings=False, verbose=False, print_per_layer_stat=False)
-    print(f'Main model complexity: M params={num_params / 10**6:,} G flops={macs * 2 / 10**9:,}')
-
-    if args.fvcore:
-        input_ = torch.rand((1, 3, cfg.data.height, cfg.data.width), dtype=next(model.parameters()).dtype,
-                                             device=next(model.parameters()).device)
-        flops = FlopCountAnalysis(model, input_)
-        print(f"Main model complexity by fvcore: {flops.total()}")
-        print(flop_count_table(flops))
+        # the counted complexity is analytic, so reduced precision only speeds up the traced forward
+        torch.backends.cuda.matmul.allow_tf32 = True
+        torch.backends.cudnn.allow_tf32 = True
+
+    cache_path = get_cache_path(cfg, args.classes)
+    cache = {}
+    if args.use_cache and osp.isfile(cache_path):
+        with open(cache_path) as f:
+            cache = json.load(f)
+
+    num_train_classes = args.num_classes if args.num_classes else cache.get('num_train_classes')
+    if num_train_classes is None:
+        datamanager = build_datamanager(cfg, args.classes)
+        num_train_classes = datamanager.num_train_ids
+    if cache.get('num_train_classes') != num_train_classes:
+        cache = {'num_train_classes': num_train_classes}
+
+    backend = 'fvcore' if args.fvcore else 'ptflops'
+    if backend in cache:
+        macs, num_params = cache[backend]
+    else:
+        print(f'Building main model: {cfg.model.name}')
+        model = torchreid.models.build_model(**model_kwargs(cfg, num_train_classes))
+        model.eval()
+        model.to('cuda' if cfg.use_gpu else 'cpu')
+        if args.fvcore:
+            num_params = sum(p.numel() for p in model.parameters() if p.requires_grad)
+            param = next(model.parameters())
+            input_ = torch.zeros((1, 3, cfg.data.height, cfg.data.width), dtype=param.dtype, device=param.device)
+            macs = fvcore_complexity(model, input_, args.verbose)
+        else:
+            macs, num_params = get_model_complexity_info(model, (3, cfg.data.height, cfg.data.width),
+                                                         as_strings=False, verbose=False,
+                                                         print_per_layer_stat=False)
+        if args.use_cache:
+            cache[backend] = (macs, num_params)
+            os.makedirs(osp.dirname(cache_path), exist_ok=True)
+            with open(cache_path, 'w') as f:
+                json.dump(cache, f)
+    print(f'Main model complexity by {backend}: M params={num_params / 10**6:,} G flops={macs * 2 / 10**9:,}')
 
     if args.out:
         out = []
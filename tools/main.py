@@ -13,7 +13,8 @@ from ptflops import get_model_complexity_info
 from scripts.default_config import (get_default_config,
                                     lr_scheduler_kwargs, model_kwargs,
                                     optimizer_kwargs,
-                                    merge_from_files_with_base)
+                                    merge_from_files_with_base,
+                                    merge_from_dict_with_base)
 from scripts.script_utils import (build_base_argparser, reset_config,
                                   check_classification_classes,
                                   build_datamanager,
@@ -27,7 +28,14 @@ from torchreid.integration.nncf.compression_script_utils import (make_nncf_chang
                                                                  make_nncf_changes_in_training)
 
 
-def main():
+def main(argv=None, config=None):
+    """Trains a model.
+
+    Args:
+        argv (list, optional): command-line arguments; sys.argv is used if None.
+        config (dict, optional): in-memory config merged on top of the config file,
+            lets the training be launched from another script without a temporary yaml.
+    """
     parser = build_base_argparser()
     parser.add_argument('-e', '--auxiliary-models-cfg', type=str, nargs='*', default='',
                         help='path to extra config files')
@@ -39,12 +47,14 @@ def main():
                         help='Enable NNCF pruning algorithm')
     parser.add_argument('--aux-config-opts', nargs='+', default=None,
                         help='Modify aux config options using the command-line')
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
     cfg = get_default_config()
     cfg.use_gpu = torch.cuda.is_available() and args.gpu_num > 0
     if args.config_file:
         merge_from_files_with_base(cfg, args.config_file)
+    if config is not None:
+        merge_from_dict_with_base(cfg, config)
     reset_config(cfg, args)
     cfg.merge_from_list(args.opts)
 
@@ -60,7 +70,20 @@ def main():
 
     log_name = 'test.log' if cfg.test.evaluate else 'train.log'
     log_name += time.strftime('-%Y-%m-%d-%H-%M-%S')
+    stdout = sys.stdout
     sys.stdout = Logger(osp.join(cfg.data.save_dir, log_name))
+    log_dir = cfg.data.tb_log_dir if cfg.data.tb_log_dir else cfg.data.save_dir
+    # main() may be called many times in one process, the writer's file and thread must not outlive the run
+    tb_writer = SummaryWriter(log_dir=log_dir)
+    try:
+        run(cfg, args, is_nncf_used, tb_writer)
+    finally:
+        tb_writer.close()
+        sys.stdout.close()
+        sys.stdout = stdout
+
+
+def run(cfg, args, is_nncf_used, tb_writer):
     sha_commit, branch_name = get_git_revision()
     print(f'HEAD is: {branch_name}')
     print(f'commit SHA is: {sha_commit}\n')
@@ -130,9 +153,8 @@ def main():
                                                             gpu_num=args.gpu_num,
                                                             split_models=args.split_models)
 
-    log_dir = cfg.data.tb_log_dir if cfg.data.tb_log_dir else cfg.data.save_dir
     run_training(cfg, datamanager, model, optimizer, scheduler, extra_device_ids,
-                 aux_lr, tb_writer=SummaryWriter(log_dir=log_dir),
+                 aux_lr, tb_writer=tb_writer,
                  aux_config_opts=args.aux_config_opts,
                  should_freeze_aux_models=should_freeze_aux_models,
                  nncf_metainfo=nncf_metainfo,
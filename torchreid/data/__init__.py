@@ -1,3 +1,4 @@
 from __future__ import absolute_import, print_function
 
 from .datamanager import ImageDataManager
+from .prefetcher import CUDAPrefetcher
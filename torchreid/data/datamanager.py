@@ -31,6 +31,8 @@ class ImageDataManager():
         batch_size_train (int, optional): number of images in a training batch. Default is 32.
         batch_size_test (int, optional): number of images in a test batch. Default is 32.
         workers (int, optional): number of workers. Default is 4.
+        persistent_test_workers (bool, optional): keep the test loader workers alive between evaluations.
+            Default is False.
         train_sampler (str, optional): sampler. Default is RandomSampler.
         correct_batch_size (bool, optional): this heuristic improves multilabel training on small datasets
     """
@@ -48,6 +50,7 @@ class ImageDataManager():
         batch_size_test=32,
         correct_batch_size = False,
         workers=4,
+        persistent_test_workers=False,
         train_sampler='RandomSampler',
         custom_dataset_roots=[''],
         custom_dataset_types=[''],
@@ -79,6 +82,8 @@ class ImageDataManager():
         if correct_batch_size:
             batch_size_train = self.calculate_batch(batch_size_train, len(train_dataset))
         batch_size_train = max(1, min(batch_size_train, len(train_dataset)))
+        # keep the workers alive between epochs instead of respawning them and re-pickling the dataset every epoch
+        workers_kwargs = dict(persistent_workers=True) if workers > 0 else {}
         self.train_loader = torch.utils.data.DataLoader(
             train_dataset,
             sampler=build_train_sampler(
@@ -90,7 +95,8 @@ class ImageDataManager():
             worker_init_fn=worker_init_fn,
             num_workers=workers,
             pin_memory=self.use_gpu,
-            drop_last=True
+            drop_last=True,
+            **workers_kwargs
         )
         self.num_iter = len(self.train_loader)
         print('=> Loading test dataset')
@@ -114,7 +120,8 @@ class ImageDataManager():
             num_workers=workers,
             worker_init_fn=worker_init_fn,
             pin_memory=self.use_gpu,
-            drop_last=False
+            drop_last=False,
+            persistent_workers=persistent_test_workers and workers > 0,
         )
 
         print('\n')
@@ -51,8 +51,7 @@ class ImageDataset:
                 targets = torch.IntTensor(obj_id)
             else:
                 targets = torch.zeros(self.num_ids)
-                for obj in obj_id:
-                    targets[obj] = 1
+                targets[list(obj_id)] = 1
             obj_id = targets
 
         if self.transform is not None:
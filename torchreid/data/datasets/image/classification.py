@@ -81,24 +81,25 @@ class ExternalDatasetWrapper(ImageDataset):
         return len(self.data_provider)
 
     def get_input(self, idx: int):
-        img = self.data_provider[idx]['img']
+        return self._transform_input(self.data_provider[idx]['img'])
+
+    def _transform_input(self, img):
         if self.transform is not None:
             img = self.transform(img)
         return img
 
     def __getitem__(self, idx: int):
-        input_image = self.get_input(idx)
-        label = self.data_provider[idx]['label']
+        # the provider may decode the image on every access, so the item is fetched once
+        item = self.data_provider[idx]
+        input_image = self._transform_input(item['img'])
+        label = item['label']
 
         if isinstance(label, (tuple, list)): # when multi-label classification is available
             if len(self.mixed_cls_heads_info):
                 targets = torch.IntTensor(label)
             else:
                 targets = torch.zeros(self.num_ids)
-                for obj in label:
-                    idx = int(obj)
-                    if idx >= 0:
-                        targets[idx] = 1
+                targets[[int(obj) for obj in label if int(obj) >= 0]] = 1
             label = targets
         else:
             label = int(label)
@@ -0,0 +1,50 @@
+# Copyright (C) 2020-2021 Intel Corporation
+# SPDX-License-Identifier: Apache-2.0
+#
+
+from __future__ import absolute_import, division, print_function
+
+import torch
+
+
+class CUDAPrefetcher:
+    r"""Wraps a data loader and copies the next batch to the GPU on a side CUDA stream
+    while the current batch is being processed.
+
+    Follows the data_prefetcher of NVIDIA Apex (examples/imagenet/main_amp.py).
+    The copies are asynchronous only if the loader is built with ``pin_memory=True``.
+
+    Args:
+        loader (DataLoader): loader yielding tuples or lists of tensors.
+    """
+
+    def __init__(self, loader):
+        self.loader = loader
+        self.stream = torch.cuda.Stream()
+
+    def __len__(self):
+        return len(self.loader)
+
+    def __iter__(self):
+        loader_iter = iter(self.loader)
+        next_data = self._preload(loader_iter)
+        while next_data is not None:
+            cur_stream = torch.cuda.current_stream()
+            cur_stream.wait_stream(self.stream)
+            data = next_data
+            for item in data:
+                if isinstance(item, torch.Tensor):
+                    # the tensors were allocated on the side stream but are consumed on the current one
+                    item.record_stream(cur_stream)
+            next_data = self._preload(loader_iter)
+            yield data
+
+    def _preload(self, loader_iter):
+        try:
+            data = next(loader_iter)
+        except StopIteration:
+            return None
+
+        with torch.cuda.stream(self.stream):
+            return [item.cuda(non_blocking=True) if isinstance(item, torch.Tensor) else item
+                    for item in data]
@@ -995,6 +995,8 @@ def build_test_transform(height, width, norm_mean=(0.485, 0.456, 0.406), norm_st
         print(f'+ resize to {t_h}x{t_w}')
         return Resize((t_h, t_w), to_pill=to_pill)
     print('Building test transforms ...')
+    # ToTensor accepts HWC uint8 arrays as is, so go through PIL only if a PIL-only transform follows
+    force_gray_scale = transforms is not None and transforms.force_gray_scale.enable
     transform_te = []
     if transforms.test.resize_first:
         transform_te.append(get_resize(height, width, transforms.test.resize_scale, to_pill=False))
@@ -1002,10 +1004,10 @@ def build_test_transform(height, width, norm_mean=(0.485, 0.456, 0.406), norm_st
         print('+ center_crop')
         transform_te.append(CenterCrop(margin=transforms.center_crop.margin))
     if not transforms.test.resize_first:
-        transform_te.append(get_resize(height, width, transforms.test.resize_scale))
-    else:
+        transform_te.append(get_resize(height, width, transforms.test.resize_scale, to_pill=force_gray_scale))
+    elif force_gray_scale:
         transform_te.append(ToPILL())
-    if transforms is not None and transforms.force_gray_scale.enable:
+    if force_gray_scale:
         print('+ force_gray_scale')
         transform_te.append(ForceGrayscale())
     print('+ to torch tensor of range [0, 1]')
@@ -1024,7 +1026,7 @@ def build_inference_transform(height, width, norm_mean=(0.485, 0.456, 0.406),
     print('+ to torch tensor of range [0, 1]')
     print(f'+ normalization (mean={norm_mean}, std={norm_std})')
     transform_te = Compose([
-        Resize((height, width)),
+        Resize((height, width), to_pill=False),
         ToTensor(),
         Normalize(mean=norm_mean, std=norm_std),
     ])
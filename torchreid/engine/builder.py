@@ -48,6 +48,7 @@ def build_engine(cfg, datamanager, model, optimizer, scheduler,
             target_metric=cfg.train.target_metric,
             use_ema_decay=cfg.train.ema.enable,
             ema_decay=cfg.train.ema.ema_decay,
+            ema_start_epoch=cfg.train.ema.ema_start_epoch,
             asl_gamma_neg=cfg.loss.asl.gamma_neg,
             asl_gamma_pos=cfg.loss.asl.gamma_pos,
             asl_p_m=cfg.loss.asl.p_m,
@@ -13,8 +13,9 @@ import datetime
 import math
 import os
 import os.path as osp
+import random
 import time
-from collections import namedtuple, OrderedDict
+from collections import namedtuple
 from copy import deepcopy
 from torchreid.utils.tools import StateCacher, set_random_seed
 import optuna
@@ -23,12 +24,13 @@ import numpy as np
 import torch
 from torch.optim.lr_scheduler import OneCycleLR
 
+from torchreid.data import CUDAPrefetcher
 from torchreid.integration.nncf.compression import (get_nncf_complession_stage,
                                                     get_nncf_prepare_for_tensorboard)
 from torchreid.optim import ReduceLROnPlateauV2, WarmupScheduler, CosineAnnealingCycleRestart
 from torchreid.utils import (AverageMeter, MetricMeter, get_model_attr,
                              open_all_layers, open_specified_layers,
-                             save_checkpoint, ModelEmaV2, sample_mask)
+                             save_checkpoint, state_dict_to_cpu, ModelEmaV2, sample_mask)
 
 
 EpochIntervalToValue = namedtuple('EpochIntervalToValue', ['first', 'last', 'value_inside', 'value_outside'])
@@ -46,6 +48,25 @@ def _get_cur_action_from_epoch_interval(epoch_interval, epoch):
     return epoch_interval.value_inside
 
 
+def rand_bbox(size, lam):
+    W = size[2]
+    H = size[3]
+    cut_rat = math.sqrt(1. - lam)
+    cut_w = int(W * cut_rat)
+    cut_h = int(H * cut_rat)
+
+    # uniform
+    cx = random.randrange(W)
+    cy = random.randrange(H)
+
+    bbx1 = min(max(cx - cut_w // 2, 0), W)
+    bby1 = min(max(cy - cut_h // 2, 0), H)
+    bbx2 = min(max(cx + cut_w // 2, 0), W)
+    bby2 = min(max(cy + cut_h // 2, 0), H)
+
+    return bbx1, bby1, bbx2, bby2
+
+
 class Engine(metaclass=abc.ABCMeta):
     r"""A generic base Engine class for both image- and video-reid."""
     def __init__(self,
@@ -68,6 +89,7 @@ class Engine(metaclass=abc.ABCMeta):
                  epoch_interval_for_turn_off_mutual_learning=None,
                  use_ema_decay=False,
                  ema_decay=0.999,
+                 ema_start_epoch=0,
                  seed=5,
                  aug_type='',
                  decay_power=3,
@@ -81,6 +103,8 @@ class Engine(metaclass=abc.ABCMeta):
         self.save_all_chkpts = save_all_chkpts
         self.writer = None
         self.use_ema_decay = use_ema_decay
+        self.ema_start_epoch = ema_start_epoch
+        self._ema_started = False
         self.start_epoch = 0
         self.lr_finder = lr_finder
         self.fixbase_epoch = 0
@@ -96,10 +120,13 @@ class Engine(metaclass=abc.ABCMeta):
         self.state_cacher = StateCacher(in_memory=True, cache_dir=None)
         self.param_history = set()
         self.seed = seed
-        self.models = OrderedDict()
-        self.optims = OrderedDict()
-        self.scheds = OrderedDict()
+        self.models = {}
+        self.optims = {}
+        self.scheds = {}
+        self._step_fns = {}
+        self._has_warmup = {}
         self.ema_model = None
+        self._ema_stream = None
         if should_freeze_aux_models:
             print(f'Engine: should_freeze_aux_models={should_freeze_aux_models}')
         self.should_freeze_aux_models = should_freeze_aux_models
@@ -109,6 +136,10 @@ class Engine(metaclass=abc.ABCMeta):
         self.epoch_interval_for_aux_model_freeze = epoch_interval_for_aux_model_freeze
         self.epoch_interval_for_turn_off_mutual_learning = epoch_interval_for_turn_off_mutual_learning
         self.model_names_to_freeze = []
+        self._frozen_aux_models = set()
+        self._aux_model_params = {}
+        self._cur_freeze_aux = False
+        self._cur_turn_off_ml = False
         self.current_lr = None
         self.warmup_finished = True
         self.aug_type = aug_type
@@ -116,6 +147,10 @@ class Engine(metaclass=abc.ABCMeta):
         self.aug_prob = aug_prob
         self.aug_index = None
         self.lam = None
+        self._aug_gens = {}
+        self._aug_seed = seed
+        # the augmentation is chosen once, not for every batch
+        self._batch_aug_fn = {'fmix': self._fmix, 'mixup': self._mixup, 'cutmix': self._cutmix}.get(aug_type)
         self.decay_power = decay_power
         self.alpha = alpha
 
@@ -160,17 +195,13 @@ class Engine(metaclass=abc.ABCMeta):
         if self.epoch_interval_for_aux_model_freeze is None:
             # simple case
             return True
-        res = _get_cur_action_from_epoch_interval(self.epoch_interval_for_aux_model_freeze, epoch)
-        print(f'_should_freeze_aux_models: return res={res}')
-        return res
+        return _get_cur_action_from_epoch_interval(self.epoch_interval_for_aux_model_freeze, epoch)
 
     def _should_turn_off_mutual_learning(self, epoch):
         if self.epoch_interval_for_turn_off_mutual_learning is None:
             # simple case
             return False
-        res = _get_cur_action_from_epoch_interval(self.epoch_interval_for_turn_off_mutual_learning, epoch)
-        print(f'_should_turn_off_mutual_learning: return {res}')
-        return res
+        return _get_cur_action_from_epoch_interval(self.epoch_interval_for_turn_off_mutual_learning, epoch)
 
     def register_model(self, name='main_model', model=None, optim=None, sched=None):
         if self.__dict__.get('models') is None:
@@ -191,6 +222,15 @@ class Engine(metaclass=abc.ABCMeta):
         self.models[name] = model
         self.optims[name] = optim
         self.scheds[name] = sched
+        self._aux_model_params.pop(name, None)
+        self._has_warmup[name] = isinstance(sched, (WarmupScheduler, OneCycleLR))
+        # the scheduler type is resolved once here, update_lr() may be called for every batch
+        if sched is None:
+            self._step_fns.pop(name, None)
+        elif isinstance(sched, (ReduceLROnPlateauV2, WarmupScheduler)):
+            self._step_fns[name] = lambda metric, sched=sched: sched.step(metrics=metric)
+        else:
+            self._step_fns[name] = lambda metric, sched=sched: sched.step()
 
     def get_model_names(self, names=None):
         names_real = list(self.models.keys())
@@ -205,19 +245,27 @@ class Engine(metaclass=abc.ABCMeta):
     def save_model(self, epoch, save_dir, is_best=False, should_save_ema_model=False):
         def create_sym_link(path,name):
             if osp.lexists(name):
+                if osp.realpath(name) == osp.realpath(path):
+                    return
                 os.remove(name)
             os.symlink(path, name)
 
         names = self.get_model_names()
+        model_state_dicts = {}
         for name in names:
             if should_save_ema_model and name == self.main_model_name:
                 assert self.use_ema_decay
                 model_state_dict = self.ema_model.module.state_dict()
             else:
                 model_state_dict = self.models[name].state_dict()
+            model_state_dicts[name] = state_dict_to_cpu(model_state_dict)
+        if self.use_gpu:
+            # wait for all the asynchronous device to host copies at once
+            torch.cuda.synchronize()
 
+        for name in names:
             checkpoint = {
-                'state_dict': model_state_dict,
+                'state_dict': model_state_dicts[name],
                 'epoch': epoch + 1,
                 'optimizer': self.optims[name].state_dict(),
                 'scheduler': self.scheds[name].state_dict(),
@@ -264,19 +312,18 @@ class Engine(metaclass=abc.ABCMeta):
         names = self.get_model_names(names)
         name = names[0]
         lr = self.optims[name].param_groups[0]['lr']
-        if isinstance(self.scheds[name], (WarmupScheduler, OneCycleLR)):
+        if self._has_warmup[name]:
             return lr, self.scheds[name].warmup_finished
         return lr, True
 
     def update_lr(self, names=None, output_avg_metric=None):
-        names = self.get_model_names(names)
+        if names is None:
+            step_fns = self._step_fns.values()
+        else:
+            step_fns = [self._step_fns[name] for name in self.get_model_names(names) if name in self._step_fns]
 
-        for name in names:
-            if self.scheds[name] is not None:
-                if isinstance(self.scheds[name], (ReduceLROnPlateauV2, WarmupScheduler)):
-                    self.scheds[name].step(metrics=output_avg_metric)
-                else:
-                    self.scheds[name].step()
+        for step_fn in step_fns:
+            step_fn(output_avg_metric)
 
     def exit_on_plateau_and_choose_best(self, accuracy):
         '''
@@ -287,7 +334,7 @@ class Engine(metaclass=abc.ABCMeta):
         '''
 
         is_candidate_for_best = False
-        current_metric = np.round(accuracy, 4)
+        current_metric = round(float(accuracy), 4)
         if current_metric >= self.best_metric:
             self.best_metric = current_metric
             is_candidate_for_best = True
@@ -363,6 +410,8 @@ class Engine(metaclass=abc.ABCMeta):
         for self.epoch in range(self.start_epoch, self.max_epoch):
             # change the NumPy’s seed at every epoch
             np.random.seed(initial_seed + self.epoch)
+            # the batch augmentation draws from its own generators and from `random`, reseed them the same way
+            self._reseed_augmentation(initial_seed + self.epoch)
             if perf_monitor and not lr_finder: perf_monitor.on_epoch_begin(self.epoch)
             if self.compression_ctrl is not None:
                 self.compression_ctrl.scheduler.epoch_step(self.epoch)
@@ -452,17 +501,28 @@ class Engine(metaclass=abc.ABCMeta):
 
         return accuracy, self.best_metric
 
+    def _get_aux_model_params(self, model_name):
+        # only floating point parameters can require gradients
+        if model_name not in self._aux_model_params:
+            self._aux_model_params[model_name] = [p for p in self.models[model_name].parameters()
+                                                  if p.is_floating_point()]
+        return self._aux_model_params[model_name]
+
     def _freeze_aux_models(self):
         for model_name in self.model_names_to_freeze:
-            model = self.models[model_name]
-            model.eval()
-            open_specified_layers(model, [])
+            self.models[model_name].eval()
+            if model_name not in self._frozen_aux_models:
+                for p in self._get_aux_model_params(model_name):
+                    p.requires_grad = False
+                self._frozen_aux_models.add(model_name)
 
     def _unfreeze_aux_models(self):
         for model_name in self.model_names_to_freeze:
-            model = self.models[model_name]
-            model.train()
-            open_all_layers(model)
+            self.models[model_name].train()
+            if model_name in self._frozen_aux_models:
+                for p in self._get_aux_model_params(model_name):
+                    p.requires_grad = True
+                self._frozen_aux_models.discard(model_name)
 
     def configure_lr_finder(self, trial, finder_cfg):
         if trial is None:
@@ -479,21 +539,34 @@ class Engine(metaclass=abc.ABCMeta):
 
     def backup_model(self):
         print("backuping model...")
-        model_device = next(self.models[self.main_model_name].parameters()).device
-        # explicitly put the model on the CPU before storing it in memory
-        self.state_cacher.store(key="model",
-                                state_dict=get_model_attr(self.models[self.main_model_name], 'cpu')().state_dict())
+        state_dict = get_model_attr(self.models[self.main_model_name], 'state_dict')()
+        # keep the copy on the model's device, this avoids moving the whole model to the CPU and back
+        if not self._state_dict_fits_on_device(state_dict):
+            state_dict = state_dict_to_cpu(state_dict)
+            if self.use_gpu:
+                torch.cuda.synchronize()
+        self.state_cacher.store(key="model", state_dict=state_dict)
         self.state_cacher.store(key="optimizer", state_dict=self.optims[self.main_model_name].state_dict())
-        # restore the model device
-        get_model_attr(self.models[self.main_model_name],'to')(model_device)
 
     def restore_model(self):
         print("restoring model and seeds to initial state...")
-        model_device = next(self.models[self.main_model_name].parameters()).device
         get_model_attr(self.models[self.main_model_name], 'load_state_dict')(self.state_cacher.retrieve("model"))
         self.optims[self.main_model_name].load_state_dict(self.state_cacher.retrieve("optimizer"))
-        get_model_attr(self.models[self.main_model_name],'to')(model_device)
         set_random_seed(self.seed)
+        self._reseed_augmentation(self.seed)
+
+    @staticmethod
+    def _state_dict_fits_on_device(state_dict, margin=1.2):
+        tensors = [v for v in state_dict.values() if isinstance(v, torch.Tensor)]
+        if not tensors or not tensors[0].is_cuda:
+            return False
+        device = tensors[0].device
+        if hasattr(torch.cuda, 'mem_get_info'):
+            free_memory = torch.cuda.mem_get_info(device)[0]
+        else:
+            free_memory = torch.cuda.get_device_properties(device).total_memory - torch.cuda.memory_reserved(device)
+        size = sum(v.numel() * v.element_size() for v in tensors)
+        return free_memory > margin * size
 
     def train(self, print_freq=10, fixbase_epoch=0, open_layers=None, lr_finder=False, perf_monitor=None,
               stop_callback=None):
@@ -504,7 +577,11 @@ class Engine(metaclass=abc.ABCMeta):
 
         self.set_model_mode('train')
 
-        if not self._should_freeze_aux_models(self.epoch):
+        # the epoch-dependent actions are resolved once per epoch, not in the batch loop
+        self._cur_freeze_aux = self._should_freeze_aux_models(self.epoch)
+        self._cur_turn_off_ml = self._should_turn_off_mutual_learning(self.epoch)
+
+        if not self._cur_freeze_aux:
             # NB: it should be done before `two_stepped_transfer_learning`
             # to give possibility to freeze some layers in the unlikely event
             # that `two_stepped_transfer_learning` is used together with nncf
@@ -514,23 +591,40 @@ class Engine(metaclass=abc.ABCMeta):
             self.epoch, fixbase_epoch, open_layers
         )
 
-        if self._should_freeze_aux_models(self.epoch):
+        if self._cur_freeze_aux:
             self._freeze_aux_models()
 
         self.num_batches = len(self.train_loader)
-        end = time.time()
-        for self.batch_idx, data in enumerate(self.train_loader):
+        # overlap host to device copies of the next batch with processing of the current one
+        train_loader = CUDAPrefetcher(self.train_loader) if self.use_gpu else self.train_loader
+        if self.use_gpu:
+            # on GPU the batch time is measured with CUDA events over the iterations between two logging steps,
+            # so that the timing never waits for the device outside of logging
+            window_start = torch.cuda.Event(enable_timing=True)
+            window_end = torch.cuda.Event(enable_timing=True)
+            window_start.record()
+            window_size = 0
+        # the EMA of the weights is not accumulated during warmup, it starts from the weights after it
+        update_ema = (not lr_finder and self.use_ema_decay and self.ema_model.decay < 1.
+                      and self.epoch >= self.ema_start_epoch and self.get_current_lr()[1])
+        end = time.perf_counter()
+        for self.batch_idx, data in enumerate(train_loader):
             if perf_monitor and not lr_finder: perf_monitor.on_train_batch_begin(self.batch_idx)
 
-            data_time.update(time.time() - end)
+            data_time.update(time.perf_counter() - end)
 
             if self.compression_ctrl:
                 self.compression_ctrl.scheduler.step(self.batch_idx)
 
+            if self._ema_stream is not None:
+                # the weights must not be updated by the optimizer while the EMA update still reads them
+                torch.cuda.current_stream().wait_stream(self._ema_stream)
             loss_summary, avg_acc = self.forward_backward(data)
-            batch_time.update(time.time() - end)
-            last_main_loss = loss_summary[self.get_model_names()[0]]
-            if math.isnan(last_main_loss) or math.isinf(last_main_loss):
+            if self.use_gpu:
+                window_size += 1
+            else:
+                batch_time.update(time.perf_counter() - end)
+            if not math.isfinite(loss_summary[self.main_model_name]):
                 raise RuntimeError('Loss is NaN or Inf, exiting the training...')
 
             losses.update(loss_summary)
@@ -539,10 +633,17 @@ class Engine(metaclass=abc.ABCMeta):
 
             if not lr_finder and (((self.batch_idx + 1) % print_freq) == 0 or
                                         self.batch_idx == self.num_batches - 1):
+                if self.use_gpu:
+                    window_end.record()
+                    window_end.synchronize()
+                    batch_time.update(window_start.elapsed_time(window_end) / 1000 / window_size, window_size)
+                    window_start, window_end = window_end, window_start
+                    window_size = 0
                 nb_this_epoch = self.num_batches - (self.batch_idx + 1)
                 nb_future_epochs = (self.max_epoch - (self.epoch + 1)) * self.num_batches
                 eta_seconds = batch_time.avg * (nb_this_epoch+nb_future_epochs)
                 eta_str = str(datetime.timedelta(seconds=int(eta_seconds)))
+                cur_lr = self.get_current_lr()[0]
                 print(
                     f'epoch: [{self.epoch + 1}/{self.max_epoch}][{self.batch_idx + 1}/{self.num_batches}]\t'
                     f'time {batch_time.val:.3f} ({batch_time.avg:.3f})\t'
@@ -550,100 +651,119 @@ class Engine(metaclass=abc.ABCMeta):
                     f'cls acc {accuracy.val:.3f} ({accuracy.avg:.3f})\t'
                     f'eta {eta_str}\t'
                     f'{losses}\t'
-                    f'lr {self.get_current_lr()[0]:.6f}'
+                    f'lr {cur_lr:.6f}'
                 )
 
-            if self.writer is not None and not lr_finder:
-                n_iter = self.epoch * self.num_batches + self.batch_idx
-                self.writer.add_scalar('Train/time', batch_time.avg, n_iter)
-                self.writer.add_scalar('Train/data', data_time.avg, n_iter)
-                self.writer.add_scalar('Aux/lr', self.get_current_lr()[0], n_iter)
-                self.writer.add_scalar('Accuracy/train', accuracy.avg, n_iter)
-                for name, meter in losses.meters.items():
-                    self.writer.add_scalar('Loss/' + name, meter.avg, n_iter)
-
-            end = time.time()
-            self.current_lr, self.warmup_finished = self.get_current_lr()
+                if self.writer is not None:
+                    # the scalars are written at the logging steps only to keep the event file I/O off the hot path
+                    n_iter = self.epoch * self.num_batches + self.batch_idx
+                    self.writer.add_scalar('Train/time', batch_time.avg, n_iter)
+                    self.writer.add_scalar('Train/data', data_time.avg, n_iter)
+                    self.writer.add_scalar('Aux/lr', cur_lr, n_iter)
+                    self.writer.add_scalar('Accuracy/train', accuracy.avg, n_iter)
+                    for name, meter in losses.meters.items():
+                        self.writer.add_scalar('Loss/' + name, meter.avg, n_iter)
+
+            end = time.perf_counter()
             if stop_callback and stop_callback.check_stop():
                 break
-            if not lr_finder and self.use_ema_decay:
-                self.ema_model.update(self.models[self.main_model_name])
+            if update_ema:
+                self._update_ema()
             if self.per_batch_annealing:
+                # keep the LR of the iteration before the scheduler step
+                self.current_lr, self.warmup_finished = self.get_current_lr()
                 self.update_lr()
 
+        if self._ema_stream is not None:
+            torch.cuda.current_stream().wait_stream(self._ema_stream)
+
+        if not self.per_batch_annealing:
+            # LR does not change inside the epoch
+            self.current_lr, self.warmup_finished = self.get_current_lr()
+
         return losses.meters['loss'].avg
 
+    def _update_ema(self):
+        model = self.models[self.main_model_name]
+        update_fn = self.ema_model.update if self._ema_started else self.ema_model.set
+        self._ema_started = True
+        if self.use_gpu:
+            # the EMA update runs on a side stream to overlap with the copy of the next batch
+            if self._ema_stream is None:
+                self._ema_stream = torch.cuda.Stream()
+            self._ema_stream.wait_stream(torch.cuda.current_stream())
+            with torch.cuda.stream(self._ema_stream):
+                update_fn(model)
+        else:
+            update_fn(model)
+
     @abc.abstractmethod
     def forward_backward(self, data):
         pass
 
+    def _get_aug_generator(self, device):
+        device = torch.device(device)
+        if device not in self._aug_gens:
+            self._aug_gens[device] = torch.Generator(device=device)
+            self._aug_gens[device].manual_seed(self._aug_seed)
+        return self._aug_gens[device]
+
+    def _reseed_augmentation(self, seed):
+        random.seed(seed)
+        self._aug_seed = seed
+        for generator in self._aug_gens.values():
+            generator.manual_seed(seed)
+
+    def _aug_randperm(self, n, device):
+        # CUDA randperm of small sizes falls back to the CPU implementation, which rejects CUDA generators
+        index = torch.randperm(n, generator=self._get_aug_generator('cpu'))
+        return index.to(device, non_blocking=True)
+
     def _apply_batch_augmentation(self, imgs):
-        def rand_bbox(size, lam):
-            W = size[2]
-            H = size[3]
-            cut_rat = np.sqrt(1. - lam)
-            cut_w = np.int(W * cut_rat)
-            cut_h = np.int(H * cut_rat)
-
-            # uniform
-            cx = np.random.randint(W)
-            cy = np.random.randint(H)
-
-            bbx1 = np.clip(cx - cut_w // 2, 0, W)
-            bby1 = np.clip(cy - cut_h // 2, 0, H)
-            bbx2 = np.clip(cx + cut_w // 2, 0, W)
-            bby2 = np.clip(cy + cut_h // 2, 0, H)
-
-            return bbx1, bby1, bbx2, bby2
-
-        if self.aug_type == 'fmix':
-            r = np.random.rand(1)
-            if self.alpha > 0 and r[0] <= self.aug_prob:
-                lam, fmask = sample_mask(self.alpha, self.decay_power, imgs.shape[-2:])
-                index = torch.randperm(imgs.size(0), device=imgs.device)
-                fmask = torch.from_numpy(fmask).float().to(imgs.device)
-                # Mix the images
-                x1 = fmask * imgs
-                x2 = (1 - fmask) * imgs[index]
-                self.aug_index = index
-                self.lam = lam
-                imgs = x1 + x2
-            else:
-                self.aug_index = None
-                self.lam = None
-
-        elif self.aug_type == 'mixup':
-            r = np.random.rand(1)
-            if self.alpha > 0 and r <= self.aug_prob:
-                lam = np.random.beta(self.alpha, self.alpha)
-                index = torch.randperm(imgs.size(0), device=imgs.device)
-
-                imgs = lam * imgs + (1 - lam) * imgs[index, :]
-                self.lam = lam
-                self.aug_index = index
-            else:
-                self.aug_index = None
-                self.lam = None
-
-        elif self.aug_type == 'cutmix':
-            r = np.random.rand(1)
-            if self.alpha > 0 and r <= self.aug_prob:
-                # generate mixed sample
-                lam = np.random.beta(self.alpha, self.alpha)
-                rand_index = torch.randperm(imgs.size(0), device=imgs.device)
-
-                bbx1, bby1, bbx2, bby2 = rand_bbox(imgs.size(), lam)
-                imgs[:, :, bbx1:bbx2, bby1:bby2] = imgs[rand_index, :, bbx1:bbx2, bby1:bby2]
-                # adjust lambda to exactly match pixel ratio
-                lam = 1 - ((bbx2 - bbx1) * (bby2 - bby1) / (imgs.size()[-1] * imgs.size()[-2]))
-                self.lam = lam
-                self.aug_index = rand_index
-            else:
-                self.aug_index = None
-                self.lam = None
+        if self._batch_aug_fn is None:
+            return imgs
+
+        if self.alpha > 0 and random.random() <= self.aug_prob:
+            imgs, self.lam, self.aug_index = self._batch_aug_fn(imgs)
+        else:
+            self.aug_index = None
+            self.lam = None
 
         return imgs
 
+    def _fmix(self, imgs):
+        generator = self._get_aug_generator(imgs.device)
+        # the mask is sampled on the device of the images, no host to device copy is needed
+        lam, fmask = sample_mask(self.alpha, self.decay_power, imgs.shape[-2:],
+                                 device=imgs.device, generator=generator)
+        index = self._aug_randperm(imgs.size(0), imgs.device)
+        fmask = fmask.to(imgs.dtype)
+        # Mix the images in place: imgs * fmask + imgs[index] * (1 - fmask)
+        shuffled = imgs.index_select(0, index).mul_(1 - fmask)
+        imgs.mul_(fmask).add_(shuffled)
+        return imgs, lam, index
+
+    def _mixup(self, imgs):
+        lam = np.random.beta(self.alpha, self.alpha)
+        index = self._aug_randperm(imgs.size(0), imgs.device)
+
+        shuffled = imgs.index_select(0, index)
+        imgs.mul_(lam).add_(shuffled, alpha=1 - lam)
+        return imgs, lam, index
+
+    def _cutmix(self, imgs):
+        # generate mixed sample
+        lam = np.random.beta(self.alpha, self.alpha)
+        rand_index = self._aug_randperm(imgs.size(0), imgs.device)
+
+        bbx1, bby1, bbx2, bby2 = rand_bbox(imgs.size(), lam)
+        # gather only the patch instead of the whole shuffled batch, narrow() returns views of imgs
+        patch = imgs.narrow(2, bbx1, bbx2 - bbx1).narrow(3, bby1, bby2 - bby1)
+        patch.copy_(patch.index_select(0, rand_index))
+        # adjust lambda to exactly match pixel ratio
+        lam = 1 - ((bbx2 - bbx1) * (bby2 - bby1) / (imgs.size()[-1] * imgs.size()[-2]))
+        return imgs, lam, rand_index
+
     def test(
         self,
         epoch,
@@ -727,6 +847,8 @@ class Engine(metaclass=abc.ABCMeta):
         else:
             for model in self.models.values():
                 open_all_layers(model)
+        # the layers of the aux models are reopened, they have to be frozen again
+        self._frozen_aux_models.clear()
 
     @abc.abstractmethod
     def _evaluate(self, model, epoch, data_loader, model_name, topk, lr_finder):
@@ -7,7 +7,6 @@
 
 from __future__ import absolute_import, division, print_function
 
-import numpy as np
 import torch
 from torch import nn
 import torch.nn.functional as F
@@ -27,7 +26,7 @@ class ImageAMSoftmaxEngine(Engine):
                  margin_type, aug_type, decay_power, alpha, lr_finder, aug_prob,
                  conf_penalty, pr_product, m, clip_grad, symmetric_ce, enable_rsc,
                  should_freeze_aux_models, nncf_metainfo, compression_ctrl, initial_lr,
-                 target_metric, use_ema_decay, ema_decay, mix_precision, **kwargs):
+                 target_metric, use_ema_decay, ema_decay, ema_start_epoch, mix_precision, **kwargs):
         super().__init__(datamanager,
                          models=models,
                          optimizers=optimizers,
@@ -45,6 +44,7 @@ class ImageAMSoftmaxEngine(Engine):
                          lr_finder=lr_finder,
                          use_ema_decay=use_ema_decay,
                          ema_decay=ema_decay,
+                         ema_start_epoch=ema_start_epoch,
                          aug_type=aug_type,
                          decay_power=decay_power,
                          alpha=alpha,
@@ -121,7 +121,7 @@ class ImageAMSoftmaxEngine(Engine):
                 all_models_logits[i] = all_models_logits[i] * self.scales[model_name]
                 if i == 0: # main model
                     main_acc = acc
-                mutual_learning = num_models > 1 and not self._should_turn_off_mutual_learning(self.epoch)
+                mutual_learning = num_models > 1 and not self._cur_turn_off_ml
                 if mutual_learning: # mutual learning
                     mutual_loss = 0
                     for j in range(num_models):
@@ -218,7 +218,7 @@ class ImageAMSoftmaxEngine(Engine):
         # before LR drop would be used as the first epoch with the new LR.
         should_exit = False
         is_candidate_for_best = False
-        current_metric = np.round(accuracy, 4)
+        current_metric = round(float(accuracy), 4)
         if self.best_metric >= current_metric:
             # one drop has been done -> start early stopping
             if round(self.current_lr, 8) < round(self.initial_lr, 8) and self.warmup_finished:
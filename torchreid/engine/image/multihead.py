@@ -4,7 +4,6 @@
 
 from __future__ import absolute_import, division, print_function
 
-import numpy as np
 import torch
 from torch import nn
 from torch.cuda.amp import GradScaler, autocast
@@ -24,7 +23,7 @@ class MultiheadEngine(Engine):
                  margin_type, aug_type, decay_power, alpha, lr_finder, aug_prob,
                  conf_penalty, pr_product, m, amb_k, amb_t, clip_grad, symmetric_ce, enable_rsc,
                  should_freeze_aux_models, nncf_metainfo, compression_ctrl, initial_lr,
-                 target_metric, use_ema_decay, ema_decay,  asl_gamma_pos, asl_gamma_neg, asl_p_m,
+                 target_metric, use_ema_decay, ema_decay, ema_start_epoch,  asl_gamma_pos, asl_gamma_neg, asl_p_m,
                  mix_precision, **kwargs):
 
         super().__init__(datamanager,
@@ -43,7 +42,8 @@ class MultiheadEngine(Engine):
                          target_metric=target_metric,
                          lr_finder=lr_finder,
                          use_ema_decay=use_ema_decay,
-                         ema_decay=ema_decay)
+                         ema_decay=ema_decay,
+                         ema_start_epoch=ema_start_epoch)
 
         loss_names = loss_name.split(',')
         assert len(loss_names) == 2
@@ -250,7 +250,7 @@ class MultiheadEngine(Engine):
         # before LR drop would be used as the first epoch with the new LR.
         should_exit = False
         is_candidate_for_best = False
-        current_metric = np.round(accuracy, 4)
+        current_metric = round(float(accuracy), 4)
         if self.best_metric >= current_metric:
             # one drop has been done -> start early stopping
             if round(self.current_lr, 8) < round(self.initial_lr, 8):
@@ -25,7 +25,7 @@ class MultilabelEngine(Engine):
                  train_patience, early_stopping, lr_decay_factor, loss_name, label_smooth,
                  lr_finder, m, amb_k, amb_t, clip_grad, aug_prob, alpha, aug_type,
                  should_freeze_aux_models, nncf_metainfo, compression_ctrl, initial_lr,
-                 target_metric, use_ema_decay, ema_decay, asl_gamma_pos, asl_gamma_neg, asl_p_m,
+                 target_metric, use_ema_decay, ema_decay, ema_start_epoch, asl_gamma_pos, asl_gamma_neg, asl_p_m,
                  mix_precision, estimate_multilabel_thresholds, **kwargs):
 
         super().__init__(datamanager,
@@ -45,6 +45,7 @@ class MultilabelEngine(Engine):
                         target_metric=target_metric,
                         use_ema_decay=use_ema_decay,
                         ema_decay=ema_decay,
+                        ema_start_epoch=ema_start_epoch,
                         aug_prob=aug_prob,
                         alpha=alpha,
                         aug_type=aug_type)
@@ -105,8 +106,7 @@ class MultilabelEngine(Engine):
                 all_models_logits.append(unscaled_model_logits)
 
             for i, model_name in enumerate(model_names):
-                should_turn_off_mutual_learning = self._should_turn_off_mutual_learning(self.epoch)
-                mutual_learning = num_models > 1 and not should_turn_off_mutual_learning
+                mutual_learning = num_models > 1 and not self._cur_turn_off_ml
                 self.optims[model_name].zero_grad()
                 loss, model_loss_summary, acc = self._single_model_losses(all_models_logits[i],
                                                                           targets,
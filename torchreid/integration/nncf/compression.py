@@ -64,6 +64,20 @@ def get_no_nncf_trace_context_manager():
         return nullcontext
 
 
+def is_nncf_tracing():
+    """
+    Returns True inside a forward pass traced by NNCF
+    """
+    if not is_nncf_enabled():
+        return False
+    try:
+        from nncf.torch.dynamic_graph.context import get_current_context
+    except ImportError:
+        return False
+    ctx = get_current_context()
+    return ctx is not None and getattr(ctx, 'is_tracing', True)
+
+
 def safe_load_checkpoint(path, map_location=None):
     try:
         from torchreid.utils import load_checkpoint
@@ -45,8 +45,7 @@ def run_acc_aware_training_loop(engine, nncf_config, configure_optimizers_fn, st
 
             for model_id, (optim, sched) in enumerate(zip(optimizers, lr_schedulers)):
                 model_name = 'main_model' if model_id == 0 else f'aux_model_{model_id}'
-                engine.optims[model_name] = optim
-                engine.scheds[model_name] = sched
+                engine.register_model(model_name, engine.models[model_name], optim, sched)
 
             engine.epoch = epoch
             return func(stop_callback=stop_callback, perf_monitor=perf_monitor)
@@ -60,7 +59,7 @@ def run_acc_aware_training_loop(engine, nncf_config, configure_optimizers_fn, st
 
             for model_id, sched in enumerate(lr_schedulers):
                 model_name = 'main_model' if model_id == 0 else f'aux_model_{model_id}'
-                engine.scheds[model_name] = sched
+                engine.register_model(model_name, engine.models[model_name], engine.optims[model_name], sched)
 
             engine.epoch = epoch
             target_metric = accuracy if engine.target_metric == 'test_acc' else loss
@@ -21,6 +21,8 @@ from torch import nn
 import torch.nn.functional as F
 from torch.nn import Parameter
 
+from torchreid.integration.nncf.compression import is_nncf_tracing
+
 
 class AngleSimpleLinear(nn.Module):
     """Computes cos of angles between input vectors and weights vectors"""
@@ -32,11 +34,25 @@ class AngleSimpleLinear(nn.Module):
         # create proxy weights
         self.weight = Parameter(torch.Tensor(in_features, out_features))
         self.weight.data.normal_().renorm_(2, 1, 1e-5).mul_(1e5)
+        self._cached_weight = None
+        self._cached_weight_key = None
 
     def forward(self, x):
-        cos_theta = F.normalize(x.view(x.shape[0], -1), dim=1).mm(F.normalize(self.weight, p=2, dim=0))
+        cos_theta = F.normalize(x.view(x.shape[0], -1), dim=1).mm(self._get_normalized_weight())
         return cos_theta.clamp(-1, 1)
 
+    def _get_normalized_weight(self):
+        if self.training or torch.is_grad_enabled() or torch.jit.is_tracing() or is_nncf_tracing():
+            return F.normalize(self.weight, p=2, dim=0)
+
+        # the weights don't change between evaluation calls, normalize them once per update;
+        # the data pointer catches a replaced parameter whose version counter happens to match
+        key = (self.weight.data_ptr(), self.weight._version, self.weight.device, self.weight.dtype)
+        if self._cached_weight is None or self._cached_weight_key != key:
+            self._cached_weight = F.normalize(self.weight, p=2, dim=0)
+            self._cached_weight_key = key
+        return self._cached_weight
+
     def get_centers(self):
         return torch.t(self.weight)
 
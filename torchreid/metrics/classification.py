@@ -9,6 +9,7 @@ import torch
 from sklearn.metrics import confusion_matrix
 from terminaltables import AsciiTable
 
+from torchreid.data import CUDAPrefetcher
 from torchreid.utils import get_model_attr
 from sklearn.metrics import precision_recall_curve
 
@@ -21,15 +22,15 @@ def score_extraction(data_loader, model, use_gpu, labelmap=[], head_id=0,
     assert feature_dump_mode in __FEATURE_DUMP_MODES
     return_featuremaps = feature_dump_mode != __FEATURE_DUMP_MODES[0]
 
-    with torch.no_grad():
+    # inference mode also skips the version counter and view tracking of the tensors
+    no_grad_mode = torch.inference_mode if hasattr(torch, 'inference_mode') else torch.no_grad
+    with no_grad_mode():
         out_scores, gt_labels, all_feature_maps, all_feature_vecs = [], [], [], []
-        for batch_idx, data in enumerate(data_loader):
+        # the next batch is copied to the GPU on a side stream while the current one is processed
+        for batch_idx, data in enumerate(CUDAPrefetcher(data_loader) if use_gpu else data_loader):
             batch_images, batch_labels = data[0], data[1]
             if perf_monitor:
                 perf_monitor.on_test_batch_begin(batch_idx, None)
-            if use_gpu:
-                batch_images = batch_images.cuda()
-                batch_labels = batch_labels.cuda()
 
             if labelmap:
                 for i, label in enumerate(labelmap):
@@ -49,7 +50,8 @@ def score_extraction(data_loader, model, use_gpu, labelmap=[], head_id=0,
             out_scores.append(logits)
             gt_labels.append(batch_labels)
 
-        out_scores = torch.cat(out_scores, 0).data.cpu().numpy()
+        # with mix_precision the models run under autocast, keep the post-processing in fp32
+        out_scores = torch.cat(out_scores, 0).data.float().cpu().numpy()
         gt_labels = torch.cat(gt_labels, 0).data.cpu().numpy()
         if apply_scale:
             s = get_model_attr(model, 'scale')
@@ -57,13 +59,13 @@ def score_extraction(data_loader, model, use_gpu, labelmap=[], head_id=0,
                 out_scores *= s
 
         if all_feature_vecs:
-            all_feature_vecs = torch.cat(all_feature_vecs, 0).data.cpu().numpy()
+            all_feature_vecs = torch.cat(all_feature_vecs, 0).data.float().cpu().numpy()
             all_feature_vecs = all_feature_vecs.reshape(all_feature_vecs.shape[0], -1)
             if feature_dump_mode == __FEATURE_DUMP_MODES[2]:
                 return (out_scores, all_feature_vecs), gt_labels
 
         if all_feature_maps:
-            all_feature_maps = torch.cat(all_feature_maps, 0).data.cpu().numpy()
+            all_feature_maps = torch.cat(all_feature_maps, 0).data.float().cpu().numpy()
             return (out_scores, all_feature_maps, all_feature_vecs), gt_labels
 
     return out_scores, gt_labels
@@ -94,20 +96,18 @@ def score_extraction_from_ir(data_loader, model, labelmap=[], apply_scale=True):
 
 
 def mean_top_k_accuracy(scores, labels, k=1):
-    idx = np.argsort(-scores, axis=-1)[:, :k]
-    labels = np.array(labels)
-    matches = np.any(idx == labels.reshape([-1, 1]), axis=-1)
-
-    classes = np.unique(labels)
-
-    accuracy_values = []
-    for class_id in classes:
-        mask = labels == class_id
-        num_valid = np.sum(mask)
-        if num_valid == 0:
-            continue
-
-        accuracy_values.append(np.sum(matches[mask]) / float(num_valid))
+    labels = np.array(labels).reshape(-1)
+    if k == 1:
+        matches = np.argmax(scores, axis=-1) == labels
+    else:
+        # the order inside top-k does not matter, so a partial sort is enough
+        kth = min(k, scores.shape[-1]) - 1
+        idx = np.argpartition(-scores, kth, axis=-1)[:, :k]
+        matches = np.any(idx == labels.reshape([-1, 1]), axis=-1)
+
+    # per-class accuracy, classes without samples are not present in `labels` at all
+    _, class_ids, num_valid = np.unique(labels, return_inverse=True, return_counts=True)
+    accuracy_values = np.bincount(class_ids, weights=matches) / num_valid
 
     return np.mean(accuracy_values) if len(accuracy_values) > 0 else 1.0
 
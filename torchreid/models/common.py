@@ -71,11 +71,11 @@ class ModelInterface(nn.Module):
     @staticmethod
     def _glob_feature_vector(x, mode, reduce_dims=True):
         if mode == 'avg':
-            out = F.adaptive_avg_pool2d(x, 1)
+            out = x.mean(dim=(2, 3), keepdim=True)
         elif mode == 'max':
             out = F.adaptive_max_pool2d(x, 1)
         elif mode == 'avg+max':
-            avg_pool = F.adaptive_avg_pool2d(x, 1)
+            avg_pool = x.mean(dim=(2, 3), keepdim=True)
             max_pool = F.adaptive_max_pool2d(x, 1)
             out = avg_pool + max_pool
         else:
@@ -15,12 +15,10 @@ __all__ = ['build_image_gcn']
 
 def gen_A(num_classes, t, rho, smoothing, adj_file):
     print(f"ACTUAL MATRIX PARAMS: t: {t}, rho: {rho}, smoothing: {smoothing}")
-    _adj = np.load(adj_file)
-    _adj[_adj < t] = 0
-    _adj[_adj >= t] = 1
+    _adj = (np.load(adj_file) >= t).astype(np.float32)
     if rho != 0.0:
-        _adj = _adj * rho / (_adj.sum(0, keepdims=True) + 1e-6)
-        _adj = _adj + np.identity(num_classes, np.int)
+        _adj *= rho / (_adj.sum(0, keepdims=True) + 1e-6)
+        np.fill_diagonal(_adj, _adj.diagonal() + 1.0)
     return _adj
 
 
@@ -47,9 +45,8 @@ class GraphAttentionLayer(nn.Module):
         Wh = torch.mm(h, self.W) # h.shape: (N, in_features), Wh.shape: (N, out_features)
         e = self._prepare_attentional_mechanism_input(Wh)
 
-        zero_vec = -9e15*torch.ones_like(e)
-        attention = torch.where(adj > 0, e, zero_vec)
-        attention = F.softmax(attention, dim=1)
+        # a finite fill keeps the attention uniform instead of NaN in rows without neighbours (possible if rho == 0)
+        attention = F.softmax(e.masked_fill_(adj <= 0, torch.finfo(e.dtype).min), dim=1)
         attention = F.dropout(attention, self.dropout, training=self.training)
         h_prime = torch.matmul(attention, Wh)
 
@@ -61,12 +58,11 @@ class GraphAttentionLayer(nn.Module):
     def _prepare_attentional_mechanism_input(self, Wh):
         # Wh.shape (N, out_feature)
         # self.a.shape (2 * out_feature, 1)
-        # Wh1&2.shape (N, 1)
+        # Wh_a.shape (N, 2), both halves of a are applied by a single matmul
         # e.shape (N, N)
-        Wh1 = torch.matmul(Wh, self.a[:self.out_features, :])
-        Wh2 = torch.matmul(Wh, self.a[self.out_features:, :])
+        Wh_a = torch.mm(Wh, self.a.view(2, self.out_features).t())
         # broadcast add
-        e = Wh1 + Wh2.T
+        e = Wh_a[:, :1] + Wh_a[:, 1:].t()
         return self.leakyrelu(e)
 
     def __repr__(self):
@@ -115,6 +111,9 @@ class Image_GCNN(ModelInterface):
                  use_last_sigmoid=True, layer_type='gcn', **kwargs):
         super().__init__(**kwargs)
         self.backbone = backbone
+        if self.mix_precision:
+            # tensor cores work on NHWC data, this saves the layout transposes around every convolution
+            self.backbone = self.backbone.to(memory_format=torch.channels_last)
         hidden_dim = int(self.backbone.num_features / hidden_dim_scale)
         embedding_dim = self.backbone.num_features
         print(f"ACTUAL GCN DIMS: hidden_dim: {hidden_dim}, embedding_dim: {embedding_dim}")
@@ -131,22 +130,28 @@ class Image_GCNN(ModelInterface):
         self.relu = nn.LeakyReLU(0.2)
         self.inp = nn.Parameter(torch.from_numpy(word_matrix).float())
         self.A = nn.Parameter(torch.from_numpy(adj_matrix).float())
+        # A is not optimized, so the normalized adjacency is recomputed only when A is changed in place
+        self._cached_adj = None
+        self._cached_adj_key = None
+        # in eval mode without autograd the label branch does not depend on the images and is computed once
+        self._cached_label_weights = None
+        self._cached_label_weights_key = None
         if self.loss == "am_binary":
             self.head = AngleSimpleLinear(self.backbone.num_features, self.num_classes)
         else:
             self.head = nn.Linear(self.backbone.num_features, self.num_classes)
 
     def forward(self, image, return_embedings=False):
+        if self.mix_precision:
+            image = image.contiguous(memory_format=torch.channels_last)
         with autocast(enabled=self.mix_precision):
             spat_features = self.backbone(image, return_featuremaps=True)
 
-            adj = self.gen_adj(self.A).detach()
-            x = self.gc1(self.inp, adj)
-            x = self.relu(x)
-            x = self.gc2(x, adj)
-            x = self.relu(x)
-            weights = x.max(dim=0)[0]
-            weights = torch.sigmoid(weights)
+            if self.training or torch.is_grad_enabled():
+                x = self._label_branch()
+                weights = torch.sigmoid(x.max(dim=0)[0])
+            else:
+                weights = self._get_eval_label_weights()
 
             weighted_cam = weights.view(1, -1, 1, 1) * spat_features
             glob_features = self.backbone._glob_feature_vector(weighted_cam, self.backbone.pooling_type, reduce_dims=False)
@@ -170,11 +175,37 @@ class Image_GCNN(ModelInterface):
 
             return tuple(out_data)
 
+    def _label_branch(self):
+        adj = self._get_adj()
+        x = self.gc1(self.inp, adj)
+        x = self.relu(x)
+        x = self.gc2(x, adj)
+        x = self.relu(x)
+        return x
+
+    def _get_eval_label_weights(self):
+        params = [self.inp, self.A, *self.gc1.parameters(), *self.gc2.parameters()]
+        # the data pointers catch replaced parameters whose version counters happen to match
+        key = (tuple((p.data_ptr(), p._version) for p in params), self.inp.device, torch.is_autocast_enabled())
+        if self._cached_label_weights is None or self._cached_label_weights_key != key:
+            with torch.no_grad():
+                self._cached_label_weights = torch.sigmoid(self._label_branch().max(dim=0)[0])
+            self._cached_label_weights_key = key
+        return self._cached_label_weights
+
+    def _get_adj(self):
+        key = (self.A.data_ptr(), self.A._version, self.A.device, self.A.dtype)
+        if self._cached_adj is None or self._cached_adj_key != key:
+            with torch.no_grad():
+                self._cached_adj = self.gen_adj(self.A)
+            self._cached_adj_key = key
+        return self._cached_adj
+
     @staticmethod
     def gen_adj(A):
-        D = torch.pow(A.sum(1).float(), -0.5)
-        D = torch.diag(D)
-        adj = torch.matmul(torch.matmul(A, D).t(), D)
+        # D * A^T * D with the diagonal D computed as row-wise scaling, A is not symmetric after gen_A
+        d = torch.pow(A.sum(1).float(), -0.5)
+        adj = A.t() * d.unsqueeze(1) * d.unsqueeze(0)
         return adj
 
     def get_config_optim(self, lrs):
@@ -77,15 +77,13 @@ class GroupASL(nn.Module):
         self.embed_len_decoder = embed_len_decoder
 
     def __call__(self, h: torch.Tensor, duplicate_pooling: torch.Tensor, out_extrap: torch.Tensor):
-        for i in range(h.shape[1]):
-            h_i = h[:, i, :]
-            if len(duplicate_pooling.shape)==3:
-                w_i = duplicate_pooling[i, :, :]
-            else:
-                w_i = duplicate_pooling
-            h_i = F.normalize(h_i.view(h_i.shape[0], -1), dim=1)
-            w_i = F.normalize(w_i, p=2., dim=0)
-            out_extrap[:, i, :] = torch.matmul(h_i, w_i)
+        # cosine similarities of all groups at once: h is [bs, groups, dim], the pooling is [groups, dim, factor]
+        h = F.normalize(h, dim=2)
+        w = F.normalize(duplicate_pooling, p=2., dim=-2)
+        if len(duplicate_pooling.shape)==3:
+            out_extrap.copy_(torch.einsum('bgd,gdf->bgf', h, w))
+        else:
+            out_extrap.copy_(torch.matmul(h, w))
 
 
 class GroupFC(nn.Module):
@@ -94,13 +92,11 @@ class GroupFC(nn.Module):
         self.embed_len_decoder = embed_len_decoder
 
     def __call__(self, h: torch.Tensor, duplicate_pooling: torch.Tensor, out_extrap: torch.Tensor):
-        for i in range(h.shape[1]):
-            h_i = h[:, i, :]
-            if len(duplicate_pooling.shape)==3:
-                w_i = duplicate_pooling[i, :, :]
-            else:
-                w_i = duplicate_pooling
-            out_extrap[:, i, :] = torch.matmul(h_i, w_i)
+        # all groups in one batched matmul: h is [bs, groups, dim], the pooling is [groups, dim, factor]
+        if len(duplicate_pooling.shape)==3:
+            out_extrap.copy_(torch.einsum('bgd,gdf->bgf', h, duplicate_pooling))
+        else:
+            out_extrap.copy_(torch.matmul(h, duplicate_pooling))
 
 
 class MLDecoder(ModelInterface):
@@ -10,6 +10,7 @@
 
 import math
 
+import torch
 import torch.nn as nn
 from torch.cuda.amp import autocast
 
@@ -183,6 +184,9 @@ class MobileNetV3(ModelInterface):
                 AngleSimpleLinear(output_channel, self.num_classes),
             )
         self._initialize_weights()
+        if self.mix_precision:
+            # depthwise convolutions get the fast cuDNN kernels only for NHWC half-precision data
+            self.to(memory_format=torch.channels_last)
 
     def extract_features(self, x):
         y = self.conv(self.features(x))
@@ -214,6 +218,8 @@ class MobileNetV3(ModelInterface):
 
     def forward(self, x, return_featuremaps=False, get_embeddings=False, gt_labels=None, return_all=False,
                 apply_scale=False):
+        if self.mix_precision:
+            x = x.contiguous(memory_format=torch.channels_last)
         with autocast(enabled=self.mix_precision):
             if self.input_IN is not None:
                 x = self.input_IN(x)
@@ -30,14 +30,17 @@ class SAM(torch.optim.Optimizer):
             return True
 
         grad_norm = self._grad_norm()
-        for group in self.param_groups:
-            scale = self.rho / (grad_norm + 1e-12)
-
-            for p in group["params"]:
-                if p.grad is None: continue
-                self.state[p]["old_p"] = p.data.clone()
-                e_w = (torch.pow(p, 2) if self.adaptive else 1.0) * p.grad * scale.to(p)
-                p.add_(e_w)  # climb to the local maximum "w + e(w)"
+        scale = float(self.rho / (grad_norm + 1e-12))
+        params = self._params_with_grad()
+        grads = [p.grad for p in params]
+        for p in params:
+            self.state[p]["old_p"] = p.data.clone()
+        if self.adaptive:
+            e_ws = torch._foreach_mul(params, params)
+            torch._foreach_mul_(e_ws, grads)
+        else:
+            e_ws = grads
+        torch._foreach_add_(params, e_ws, alpha=scale)  # climb to the local maximum "w + e(w)"
 
         if zero_grad: self.zero_grad()
         return False
@@ -48,10 +51,8 @@ class SAM(torch.optim.Optimizer):
             if zero_grad: self.zero_grad()
             return
 
-        for group in self.param_groups:
-            for p in group["params"]:
-                if p.grad is None: continue
-                p.data = self.state[p]["old_p"]  # get back to "w" from "w + e(w)"
+        for p in self._params_with_grad():
+            p.data = self.state[p]["old_p"]  # get back to "w" from "w + e(w)"
 
         self.base_optimizer.step()  # do the actual "sharpness-aware" update
 
@@ -62,16 +63,20 @@ class SAM(torch.optim.Optimizer):
         raise NotImplementedError("SAM doesn't work like the other optimizers,"
                                    " you should first call `first_step` and the `second_step`;")
 
+    def _params_with_grad(self):
+        return [p for group in self.param_groups for p in group["params"] if p.grad is not None]
+
     def _grad_norm(self):
         shared_device = self.param_groups[0]["params"][0].device  # put everything on the same device, in case of model parallelism
-        norm = torch.norm(
-                    torch.stack([
-                        ((torch.abs(p) if self.adaptive else 1.0) * p.grad).norm(p=2).to(shared_device)
-                        for group in self.param_groups for p in group["params"]
-                        if p.grad is not None
-                    ]),
-                    p=2
-               )
+        params = self._params_with_grad()
+        grads = [p.grad for p in params]
+        if self.adaptive:
+            grads = torch._foreach_mul(torch._foreach_abs(params), grads)
+        if hasattr(torch, '_foreach_norm'):
+            norms = torch._foreach_norm(grads, 2)
+        else:
+            norms = [g.norm(p=2) for g in grads]
+        norm = torch.norm(torch.stack([n.to(shared_device) for n in norms]), p=2)
         return norm
 
     @staticmethod
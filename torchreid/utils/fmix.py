@@ -31,6 +31,7 @@ import math
 import random
 
 import numpy as np
+import torch
 from scipy.stats import beta
 
 
@@ -144,7 +145,57 @@ def binarise_mask(mask, lam, in_shape, max_soft=0.0):
     return mask
 
 
-def sample_mask(alpha, decay_power, shape, max_soft=0.0, reformulate=False):
+def make_low_freq_image_torch(decay, shape, device=None, generator=None):
+    """ Sample a low frequency image from fourier space, torch version of `make_low_freq_image`
+    :param decay: Decay power for frequency decay prop 1/f**d
+    :param shape: Shape of desired mask, list up to 3 dims
+    :param device: Device on which the image is created
+    :param generator: Optional random number generator on the same device
+    """
+    # the last dimension is halved as in the real-valued inverse transform
+    freqs = torch.fft.rfftfreq(shape[-1], device=device) ** 2
+    for dim, size in enumerate(shape[:-1]):
+        view_shape = [1] * len(shape)
+        view_shape[dim] = size
+        freqs = freqs + torch.fft.fftfreq(size, device=device).view(view_shape) ** 2
+    freqs = freqs.sqrt()
+    scale = 1. / freqs.clamp(min=1. / max(shape)) ** decay
+
+    param = torch.randn(*freqs.shape, 2, device=device, generator=generator)
+    spectrum = torch.view_as_complex(param * scale.unsqueeze(-1))
+    mask = torch.fft.irfftn(spectrum, s=shape)
+    # the mask is not normalized, only the order of the values matters for `binarise_mask_torch`
+    return mask.unsqueeze(0)
+
+
+def binarise_mask_torch(mask, lam, in_shape, max_soft=0.0):
+    """ Binarises a given low frequency image such that it has mean lambda, torch version of `binarise_mask`
+    :param mask: Low frequency image, usually the result of `make_low_freq_image_torch`
+    :param lam: Mean value of final mask
+    :param in_shape: Shape of inputs
+    :param max_soft: Softening value between 0 and 0.5 which smooths hard edges in the mask.
+    """
+    mask = mask.reshape(-1)
+    idx = mask.argsort(descending=True)
+    num = math.ceil(lam * mask.numel()) if random.random() > 0.5 else math.floor(lam * mask.numel())  # nosec  # noqa
+
+    eff_soft = max_soft
+    if max_soft > lam or max_soft > (1-lam):
+        eff_soft = min(lam, 1-lam)
+
+    soft = int(mask.numel() * eff_soft)
+    num_low = num - soft
+    num_high = num + soft
+
+    values = torch.zeros_like(mask)
+    values[:num_low] = 1
+    values[num_low:num_high] = torch.linspace(1, 0, num_high - num_low, device=mask.device)
+    mask = torch.empty_like(mask).scatter_(0, idx, values)
+
+    return mask.reshape((1, *in_shape))
+
+
+def sample_mask(alpha, decay_power, shape, max_soft=0.0, reformulate=False, device=None, generator=None):
     """ Samples a mean lambda from beta distribution parametrised by alpha, creates a low frequency image and binarises
     it based on this lambda
     :param alpha: Alpha value for beta distribution from which to sample mean of mask
@@ -152,15 +203,22 @@ def sample_mask(alpha, decay_power, shape, max_soft=0.0, reformulate=False):
     :param shape: Shape of desired mask, list up to 3 dims
     :param max_soft: Softening value between 0 and 0.5 which smooths hard edges in the mask.
     :param reformulate: If True, uses the reformulation of [1].
+    :param device: If set, the mask is sampled with torch as a tensor on this device instead of a NumPy array.
+    :param generator: Optional random number generator on `device`
     """
     if isinstance(shape, int):
         shape = (shape,)
+    shape = tuple(shape)
     # Choose lambda
     lam = sample_lam(alpha, reformulate)
 
     # Make mask, get mean / std
-    mask = make_low_freq_image(decay_power, shape)
-    mask = binarise_mask(mask, lam, shape, max_soft)
+    if device is not None:
+        mask = make_low_freq_image_torch(decay_power, shape, device, generator)
+        mask = binarise_mask_torch(mask, lam, shape, max_soft)
+    else:
+        mask = make_low_freq_image(decay_power, shape)
+        mask = binarise_mask(mask, lam, shape, max_soft)
 
     return lam, mask
 
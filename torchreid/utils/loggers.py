@@ -74,6 +74,9 @@ class Logger:
             os.fsync(self.file.fileno())
 
     def close(self):
-        self.console.close()
+        # keep the interpreter's own streams open, so that the console can be reused
+        # when several trainings are launched from the same process
+        if self.console not in (sys.__stdout__, sys.__stderr__):
+            self.console.close()
         if self.file is not None:
             self.file.close()
@@ -13,6 +13,7 @@
 from __future__ import absolute_import, division, print_function
 import os
 import os.path as osp
+import pickle # nosec
 import gdown
 
 from collections import OrderedDict
@@ -20,13 +21,14 @@ from copy import deepcopy
 
 import torch
 from torch import nn
+from torch.nn.utils.fusion import fuse_conv_bn_eval
 
 from .tools import mkdir_if_missing, check_isfile
 
 __all__ = [
-    'save_checkpoint', 'load_checkpoint', 'resume_from_checkpoint',
+    'save_checkpoint', 'state_dict_to_cpu', 'load_checkpoint', 'resume_from_checkpoint',
     'open_all_layers', 'open_specified_layers',
-    'load_pretrained_weights', 'ModelEmaV2'
+    'load_pretrained_weights', 'fuse_conv_bn', 'ModelEmaV2'
 ]
 
 
@@ -50,6 +52,22 @@ def scheduler_to(sched, device):
     for param in sched.__dict__.values():
         params_to_device(param, device)
 
+def state_dict_to_cpu(state_dict):
+    r"""Copies a state dict to the CPU.
+
+    The device to host copies are asynchronous, so the caller has to synchronize
+    the device (e.g. with ``torch.cuda.synchronize()``) before using the result.
+    """
+    cpu_state_dict = OrderedDict(
+        (k, v.detach().to('cpu', non_blocking=True)) for k, v in state_dict.items()
+    )
+    # versions of the modules are needed to load the state dict correctly
+    metadata = getattr(state_dict, '_metadata', None)
+    if metadata is not None:
+        cpu_state_dict._metadata = metadata
+    return cpu_state_dict
+
+
 def save_checkpoint(
     state, save_dir, is_best=False, remove_module_from_keys=False, name='model'
 ):
@@ -85,7 +103,7 @@ def save_checkpoint(
     # save
     epoch = state['epoch']
     fpath = osp.join(save_dir, f'{name}.pth.tar-' + str(epoch))
-    torch.save(state, fpath)
+    torch.save(state, fpath, pickle_protocol=pickle.HIGHEST_PROTOCOL)
     print(f'Checkpoint saved to "{fpath}"')
     if is_best:
         best_link_path = osp.join(osp.dirname(fpath), f'{name}-best.pth.tar')
@@ -362,8 +380,8 @@ def load_pretrained_weights(model, file_path='', chkpt_name='model_weights', pre
         else:
             discarded_layers.append(k)
 
-    model_dict.update(new_state_dict)
-    model.load_state_dict(model_dict)
+    # the layers missing from new_state_dict keep their current values, no need to copy them onto themselves
+    model.load_state_dict(new_state_dict, strict=False)
     message = file_path if file_path else "pretrained dict"
     unmatched_layers = sorted(set(model_dict.keys()) - set(new_state_dict))
     if len(matched_layers) == 0:
@@ -379,6 +397,37 @@ def load_pretrained_weights(model, file_path='', chkpt_name='model_weights', pre
     _print_loading_weights_inconsistencies(discarded_layers, unmatched_layers)
 
 
+def fuse_conv_bn(model):
+    r"""Folds BatchNorm2d layers into the preceding convolutions for inference.
+
+    Handles the ``nn.Sequential`` containers where a BatchNorm2d directly follows a Conv2d
+    and the blocks that keep them as ``conv`` and ``bn`` attributes applied one after another.
+    The model is changed in place and can't be trained afterwards.
+
+    Args:
+        model (nn.Module): network model.
+    """
+    def _can_fuse(conv, bn):
+        # BatchNorm2d subclasses (e.g. with a built-in activation) do more than the affine transform
+        return isinstance(conv, nn.Conv2d) and type(bn) is nn.BatchNorm2d and bn.track_running_stats
+
+    model.eval()
+    for module in model.modules():
+        # subclasses like Concurrent run their children as parallel branches, not as a chain
+        if type(module) is nn.Sequential:
+            names = list(module._modules.keys())
+            for conv_name, bn_name in zip(names[:-1], names[1:]):
+                conv, bn = module._modules[conv_name], module._modules[bn_name]
+                if _can_fuse(conv, bn):
+                    module._modules[conv_name] = fuse_conv_bn_eval(conv, bn)
+                    module._modules[bn_name] = nn.Identity()
+        elif _can_fuse(getattr(module, 'conv', None), getattr(module, 'bn', None)):
+            module.conv = fuse_conv_bn_eval(module.conv, module.bn)
+            module.bn = nn.Identity()
+
+    return model
+
+
 # Is based on
 # https://github.com/rwightman/pytorch-image-models/blob/master/timm/utils/model_ema.py
 class ModelEmaV2(nn.Module):